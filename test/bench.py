@@ -2,18 +2,17 @@
 """
 Benchmark WebSocket streaming for Yap ASR server.
 
-Streams PCM16@24k from audio files in JSON frames to simulate realtime voice.
+Streams PCM16@24k from audio files as msgpack Audio frames (float32 samples) to simulate realtime voice.
 Measures latency (wall), time-to-first-word, and throughput under concurrency.
 """
 from __future__ import annotations
 import argparse
-import asyncio
 import os
 import time
 
 from utils import (
-    file_to_pcm16_mono_24k, file_duration_seconds, SAMPLES_DIR,
-    find_sample_files, find_sample_by_name
+    load_pcm16_mono_24k, SAMPLES_DIR,
+    find_sample_files, find_sample_by_name, run_async
 )
 from utils.metrics import summarize_results
 from clients.benchmark import BenchmarkRunner
@@ -27,6 +26,14 @@ def main() -> None:
     ap.add_argument("--concurrency", type=int, default=5, help="Max concurrent sessions")
     ap.add_argument("--file", type=str, default="mid.wav", help="Audio file from samples/")
     ap.add_argument("--rtf", type=float, default=1.0, help="Real-time factor (1.0=realtime, higher=faster)")
+    ap.add_argument("--batch-ms", type=int, default=80,
+                    help="Audio per WS message in ms, rounded to 80ms frames (80=one frame per send)")
+    ap.add_argument("--arrival-rate", type=float, default=None,
+                    help="Max new sessions per second (default: 4 x concurrency)")
+    ap.add_argument("--processes", type=int, default=1,
+                    help="Worker processes sharing --n/--concurrency (each runs its own event loop)")
+    ap.add_argument("--progress", type=float, default=0.0,
+                    help="Print a progress line every N seconds (0=off; per process with --processes)")
     ap.add_argument("--kyutai-key", type=str, default=None, help="Kyutai API key (overrides KYUTAI_API_KEY env)")
     args = ap.parse_args()
 
@@ -47,20 +54,27 @@ def main() -> None:
         print("Error: Kyutai API key missing. Use --kyutai-key or set KYUTAI_API_KEY env.")
         return
 
-    print(f"Benchmark → WS (streaming) | n={args.n} | concurrency={args.concurrency} | rtf={args.rtf} | server={args.server}")
+    print(f"Benchmark → WS (streaming) | n={args.n} | concurrency={args.concurrency} | rtf={args.rtf} | batch_ms={args.batch_ms} | processes={args.processes} | server={args.server}")
     print(f"File: {os.path.basename(file_path)}")
 
     # Load audio
-    pcm = file_to_pcm16_mono_24k(file_path)
+    pcm, _ = load_pcm16_mono_24k(file_path)
     
-    # Run benchmark
+    # Run benchmark (on uvloop when installed: cheaper socket I/O at high concurrency)
     runner = BenchmarkRunner(args.server, args.secure, debug=False)
     
-    t0 = time.time()
-    results, rejected, errors = asyncio.run(
-        runner.run_benchmark(pcm, args.n, args.concurrency, args.rtf)
-    )
-    elapsed = time.time() - t0
+    t0 = time.perf_counter_ns()
+    if args.processes > 1:
+        results, rejected, errors = runner.run_processes(
+            pcm, args.n, args.concurrency, args.rtf, args.batch_ms, args.arrival_rate, args.processes,
+            args.progress
+        )
+    else:
+        results, rejected, errors = run_async(
+            runner.run_benchmark(pcm, args.n, args.concurrency, args.rtf, args.batch_ms, args.arrival_rate,
+                                 args.progress)
+        )
+    elapsed = (time.perf_counter_ns() - t0) / 1e9
 
     # Print results
     summarize_results("WebSocket Streaming", results)
@@ -68,8 +82,8 @@ def main() -> None:
     print(f"Errors: {errors}")
     print(f"Total elapsed: {elapsed:.4f}s")
     
-    if results:
-        total_audio = sum(r["audio_s"] for r in results)
+    if len(results):
+        total_audio = float(results["audio_s"].sum())
         print(f"Total audio processed: {total_audio:.2f}s")
         print(f"Overall throughput: {total_audio/elapsed*60:.2f} sec/min = {total_audio/elapsed:.2f} min/min")
 
@@ -6,13 +6,12 @@ Streams PCM16@24k from a file to simulate realtime voice and prints partials/fin
 """
 from __future__ import annotations
 import argparse
-import asyncio
 import os
 from pathlib import Path
 
 from utils import (
-    file_to_pcm16_mono_24k, SAMPLES_DIR,
-    find_sample_files, find_sample_by_name
+    load_pcm16_mono_24k, SAMPLES_DIR,
+    find_sample_files, find_sample_by_name, run_async
 )
 from clients.interactive import InteractiveClient
 
@@ -92,14 +91,14 @@ async def run(args: argparse.Namespace) -> None:
             print(f"Available files: {[os.path.basename(f) for f in available]}")
         return
 
-    pcm = file_to_pcm16_mono_24k(file_path)
+    pcm, _ = load_pcm16_mono_24k(file_path)
     client = InteractiveClient(args.server, args.secure, debug=False, quiet=True, save_metrics=False)
     
     await client.run_session(pcm, args.rtf, file_path)
 
 
 def main() -> None:
-    asyncio.run(run(parse_args()))
+    run_async(run(parse_args()))
 
 
 if __name__ == "__main__":
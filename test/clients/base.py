@@ -1,14 +1,14 @@
 """Base client class for Yap STT API connections."""
 from __future__ import annotations
 import asyncio
-import contextlib
 import os
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Sequence
 
 import websockets
 
-from utils import ws_url, append_auth_query, AudioStreamer
+from utils import ws_url, append_auth_query, pack_audio_frames, tune_ws_socket, AudioStreamer
+from utils.audio import HOP
 from utils.messages import MessageHandler
 
 
@@ -20,6 +20,7 @@ class YapClient:
         self.secure = secure
         self.debug = debug
         self.url = ws_url(server, secure)
+        self._ws_options: Dict[str, Any] | None = None
         
     def get_auth_headers(self) -> list[tuple[str, str]]:
         """Get authentication headers. Override in subclasses."""
@@ -43,43 +44,63 @@ class YapClient:
         }
     
     async def connect_and_process(self, pcm_bytes: bytes, rtf: float, 
-                                handler: MessageHandler) -> tuple[float, float]:
-        """Connect to server and process audio. Returns (t0, last_signal_ts)."""
-        streamer = AudioStreamer(pcm_bytes, rtf, debug=self.debug)
-        ws_options = self.get_ws_options()
+                                handler: MessageHandler,
+                                frames: Sequence[bytes] | None = None,
+                                hop: int = HOP) -> tuple[float, float]:
+        """Connect to server and process audio. Returns (t0, last_signal_ts).
+
+        `frames` are prebuilt Audio messages of `hop` samples each for `pcm_bytes`;
+        callers running many sessions on the same audio pack them once and pass them in.
+        """
+        if frames is None:
+            frames = pack_audio_frames(pcm_bytes, hop)
+        streamer = AudioStreamer(frames, len(pcm_bytes) // 2, rtf, debug=self.debug, hop=hop)
+        # Options (auth headers included) are fixed per client; build them once
+        if self._ws_options is None:
+            self._ws_options = self.get_ws_options()
+        ws_options = self._ws_options
         
         t0 = time.perf_counter()
         async with websockets.connect(self.url, **ws_options) as ws:
-            # Start message processing
+            tune_ws_socket(ws)
+            # compression=None means no permessage-deflate on incompressible PCM;
+            # flag it if an option override ever lets an extension through
+            if self.debug and ws.extensions:
+                print(f"DEBUG: WebSocket extensions negotiated: {ws.extensions}")
+            # Start message processing; the session owns this task and reaps it
             recv_task = asyncio.create_task(handler.process_messages(ws, t0))
-            
-            # Wait for Ready (optional)
-            try:
-                await asyncio.wait_for(handler.ready_event.wait(), timeout=0.2)
-            except asyncio.TimeoutError:
-                pass
-            
-            # Check for immediate errors
-            if handler.done_event.is_set():
-                return t0, time.perf_counter()
-            
-            # Stream audio and capture first-audio-sent timestamp
-            first_audio_ts, last_signal_ts = await streamer.stream_audio(
-                ws, handler.eos_decider,
-                (handler.set_first_audio_sent if hasattr(handler, "set_first_audio_sent") else None)
-            )
-            
-            # Wait for final response
-            file_duration_s = len(pcm_bytes) // 2 / 24000.0
-            timeout_s = max(10.0, file_duration_s / rtf + 3.0)
             try:
-                await asyncio.wait_for(handler.done_event.wait(), timeout=timeout_s)
-            except asyncio.TimeoutError:
-                handler.handle_connection_close()
-            
-            # Clean close
-            with contextlib.suppress(Exception):
-                asyncio.create_task(ws.close(code=1000, reason="client done"))
+                # Wait for Ready (optional)
+                try:
+                    await asyncio.wait_for(handler.ready_event.wait(), timeout=0.2)
+                except asyncio.TimeoutError:
+                    pass
+                
+                # Check for immediate errors
+                if handler.done_event.is_set():
+                    return t0, time.perf_counter()
+                
+                # Stream audio and capture first-audio-sent timestamp
+                first_audio_ts, last_signal_ts = await streamer.stream_audio(
+                    ws, handler.eos_decider,
+                    (handler.set_first_audio_sent if hasattr(handler, "set_first_audio_sent") else None)
+                )
+                
+                # Wait for final response
+                file_duration_s = len(pcm_bytes) // 2 / 24000.0
+                timeout_s = max(10.0, file_duration_s / rtf + 3.0)
+                # A plain loop timer instead of wait_for: no wrapper task per session
+                deadline = asyncio.get_running_loop().call_later(timeout_s, handler.handle_timeout)
+                try:
+                    await handler.done_event.wait()
+                finally:
+                    deadline.cancel()
+            finally:
+                # Stop receiving as soon as the session is over instead of waiting
+                # for the close handshake; leaving the context then closes the socket
+                if not recv_task.done():
+                    recv_task.cancel()
+                await asyncio.gather(recv_task, return_exceptions=True)
         
         return t0, last_signal_ts
 
@@ -2,15 +2,34 @@
 from __future__ import annotations
 import asyncio
 import json
+import multiprocessing as mp
+import sys
 import time
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import shared_memory
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import List, Sequence, Tuple
 
+import numpy as np
+
+from utils.audio import HOP, hop_for_batch, pack_audio_frames
 from utils.messages import BenchMessageHandler
-from utils.metrics import calculate_basic_metrics, calculate_detailed_metrics
+from utils.network import run_async
+from utils.metrics import (
+    SessionMetrics, STORED_DTYPE, metrics_records, with_rates
+)
 from clients.base import QueryAuthClient
 
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None
+
+
+# (time.time_ns(), request index, label, exception) queued for the error log writer
+ErrorEntry = Tuple[int, int, str, BaseException]
+
 
 class CapacityRejected(Exception):
     """Raised when server rejects due to capacity."""
@@ -20,30 +39,44 @@ class CapacityRejected(Exception):
 class BenchmarkClient(QueryAuthClient):
     """Client for benchmark testing with capacity handling."""
     
-    async def run_single_session(self, pcm_bytes: bytes, rtf: float) -> Dict[str, float]:
+    async def run_single_session(self, pcm_bytes: bytes, rtf: float,
+                                 frames: Sequence[bytes] | None = None,
+                                 hop: int = HOP) -> SessionMetrics:
         """Run a single benchmark session."""
         handler = BenchMessageHandler(debug=self.debug)
         file_duration_s = len(pcm_bytes) // 2 / 24000.0
         
-        t0, last_signal_ts = await self.connect_and_process(pcm_bytes, rtf, handler)
+        t0, last_signal_ts = await self.connect_and_process(pcm_bytes, rtf, handler, frames, hop)
         
         # Check for capacity rejection
         if handler.reject_reason == "capacity":
             raise CapacityRejected("no free channels")
         
-        # Calculate metrics
+        # Calculate metrics; the streamer is internal to the session, so the
+        # last-chunk timestamp is a rough estimate
         wall = time.perf_counter() - t0
-        basic_metrics = calculate_basic_metrics(file_duration_s, wall, handler.ttfw_word, handler.ttfw_text)
-        
-        # Create a mock streamer for detailed metrics (since we don't have access to the real one)
-        class MockStreamer:
-            def __init__(self):
-                self.last_chunk_sent_ts = t0 + 0.1  # Rough estimate
-        
-        streamer = MockStreamer()
-        detailed_metrics = calculate_detailed_metrics(handler, streamer, t0, last_signal_ts, file_duration_s, rtf)
-        
-        return {**basic_metrics, **detailed_metrics}
+        return SessionMetrics.from_session(
+            handler, t0, last_signal_ts, t0 + 0.1, file_duration_s, rtf, wall
+        )
+
+
+class ArrivalGate:
+    """Token bucket that admits one session start every 1/rate seconds.
+
+    Smooths arrivals instead of bursting every free slot at once; a gate that
+    fell behind does not bank tokens, so starts never burst to catch up.
+    """
+    
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+    
+    async def wait(self) -> None:
+        now = asyncio.get_running_loop().time()
+        start = max(self._next, now)
+        self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
 
 
 class BenchmarkRunner:
@@ -55,74 +88,217 @@ class BenchmarkRunner:
         self.debug = debug
         self.results_dir = Path("test/results")
         self.errors_file = self.results_dir / "bench_errors.txt"
+        self._error_q: asyncio.Queue[ErrorEntry | None] | None = None
     
     async def run_benchmark(self, pcm_bytes: bytes, total_reqs: int, concurrency: int, 
-                          rtf: float) -> Tuple[List[Dict[str, float]], int, int]:
-        """Run benchmark with specified parameters."""
-        self.results_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Initialize error log
-        try:
-            with open(self.errors_file, "w", encoding="utf-8") as ef:
-                ef.write(f"=== Benchmark Error Log Started at {datetime.utcnow().isoformat()}Z ===\n")
-        except Exception:
-            pass
+                          rtf: float, batch_ms: int = 80,
+                          arrival_rate: float | None = None,
+                          progress_s: float = 0.0,
+                          reset_error_log: bool = True,
+                          first_idx: int = 0) -> Tuple[np.ndarray, int, int]:
+        """Run benchmark with specified parameters.
+
+        `batch_ms` of audio is coalesced into each Audio message (80 = one frame per send).
+        Sessions start at most `arrival_rate` per second (default: 4 x concurrency).
+        A progress line is printed every `progress_s` seconds (0 = off).
+        Returns (metrics table of completed sessions, rejected, errors).
+        `pcm_bytes` may be any buffer (e.g. a shared-memory view); request
+        indices in the error log start at `first_idx`.
+        """
+        if reset_error_log:
+            self._start_error_log()
         
-        sem = asyncio.Semaphore(max(1, concurrency))
-        results: List[Dict[str, float]] = []
-        rejected = 0
-        errors_total = 0
+        self._error_q = asyncio.Queue()
+        error_writer = asyncio.create_task(self._error_writer(self._error_q))
+        # Every session streams the same audio: pack the Audio messages once
+        hop = hop_for_batch(batch_ms)
+        frames = pack_audio_frames(pcm_bytes, hop)
+        # One client for the whole run: URL, auth query and WS options are
+        # resolved once; each session still opens its own socket
+        client = BenchmarkClient(self.server, self.secure, self.debug)
+        gate = ArrivalGate(arrival_rate or max(1, concurrency) * 4.0)
+        # Dynamic timeout; every session streams the same audio, so it is fixed per run
+        audio_seconds = len(pcm_bytes) // 2 / 24000.0
+        timeout = max(300.0, audio_seconds * 2 + 60.0)
+        # Preallocated flat buffer, one row per request, filled by request index
+        buf = np.empty(total_reqs, dtype=STORED_DTYPE)
+        done = np.zeros(total_reqs, dtype=bool)
+        # Outcome counters; all workers run on this loop's thread, so plain ints suffice
+        ok = rejected = errors_total = 0
+        # Shared work source: each worker pulls the next request as soon as it
+        # is free, so a slow session never leaves other workers idle
+        pending = iter(range(first_idx, first_idx + total_reqs))
         
-        async def worker(req_idx: int):
-            nonlocal errors_total, rejected
-            async with sem:
-                # Stagger stream starts with jitter to avoid thundering-herd
-                if req_idx > 0:
-                    await asyncio.sleep((req_idx % 32) * 0.025)
+        async def worker():
+            nonlocal ok, rejected, errors_total
+            for req_idx in pending:
+                # Paced arrivals avoid a thundering herd of handshakes
+                await gate.wait()
                 
                 try:
-                    client = BenchmarkClient(self.server, self.secure, self.debug)
-                    
-                    # Dynamic timeout
-                    audio_seconds = len(pcm_bytes) // 2 / 24000.0
-                    timeout = max(300.0, audio_seconds * 2 + 60.0)
-                    
                     result = await asyncio.wait_for(
-                        client.run_single_session(pcm_bytes, rtf), 
+                        client.run_single_session(pcm_bytes, rtf, frames, hop), 
                         timeout=timeout
                     )
-                    results.append(result)
+                    buf[req_idx - first_idx] = result.as_row()
+                    done[req_idx - first_idx] = True
+                    ok += 1
                     
                 except CapacityRejected as e:
                     rejected += 1
-                    self._log_error(req_idx, f"REJECTED capacity: {e}")
+                    self._log_error(req_idx, "REJECTED capacity: ", e)
                     
                 except Exception as e:
                     errors_total += 1
-                    self._log_error(req_idx, f"err={e}")
+                    self._log_error(req_idx, "err=", e)
         
-        # Run all workers
-        tasks = [asyncio.create_task(worker(i)) for i in range(total_reqs)]
-        await asyncio.gather(*tasks, return_exceptions=True)
+        async def progress():
+            # The only writer to stdout while sessions run; workers never print
+            while True:
+                await asyncio.sleep(progress_s)
+                finished = ok + rejected + errors_total
+                wall_avg = float(buf["wall_s"][done].mean()) if ok else 0.0
+                sys.stdout.write(
+                    f"progress: {finished}/{total_reqs} | ok={ok} rejected={rejected} "
+                    f"errors={errors_total} | wall avg={wall_avg:.3f}s\n"
+                )
+                sys.stdout.flush()
         
-        return results[:total_reqs], rejected, errors_total
+        # `concurrency` long-lived workers instead of one task per request
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, total_reqs)))]
+        monitor = asyncio.create_task(progress()) if progress_s > 0 else None
+        await asyncio.gather(*workers, return_exceptions=True)
+        if monitor is not None:
+            monitor.cancel()
+        
+        # Drain pending error lines
+        self._error_q.put_nowait(None)
+        await error_writer
+        
+        return with_rates(buf[done]), rejected, errors_total
+    
+    def run_processes(self, pcm_bytes: bytes, total_reqs: int, concurrency: int,
+                      rtf: float, batch_ms: int = 80, arrival_rate: float | None = None,
+                      processes: int = 2, progress_s: float = 0.0) -> Tuple[np.ndarray, int, int]:
+        """Run the benchmark split across `processes` worker processes.
+
+        One asyncio loop is capped at about one core; each worker runs its own
+        loop with its share of sessions, concurrency and arrival rate. The PCM
+        is placed in shared memory once instead of being copied to every worker.
+        """
+        # Each shard runs at least one session at a time, so never exceed --concurrency
+        processes = max(1, min(processes, concurrency, total_reqs))
+        self._start_error_log()
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(pcm_bytes)))
+        try:
+            shm.buf[:len(pcm_bytes)] = pcm_bytes
+            shards = []
+            first_idx = 0
+            for i in range(processes):
+                n = total_reqs // processes + (i < total_reqs % processes)
+                conc = max(1, concurrency // processes + (i < concurrency % processes))
+                rate = arrival_rate / processes if arrival_rate else None
+                shards.append((self.server, self.secure, self.debug, shm.name, len(pcm_bytes),
+                               n, conc, rtf, batch_ms, rate, progress_s, first_idx))
+                first_idx += n
+            # spawn: fresh interpreters, no forked event-loop state
+            with ProcessPoolExecutor(max_workers=processes, mp_context=mp.get_context("spawn")) as pool:
+                outcomes = list(pool.map(_run_shard, shards))
+        finally:
+            shm.close()
+            shm.unlink()
+        
+        table = np.concatenate([shard_table for shard_table, _, _ in outcomes])
+        rejected = sum(shard_rejected for _, shard_rejected, _ in outcomes)
+        errors_total = sum(shard_errors for _, _, shard_errors in outcomes)
+        return table, rejected, errors_total
     
-    def _log_error(self, req_idx: int, message: str) -> None:
-        """Log error to file."""
+    def _start_error_log(self) -> None:
+        """Create the results directory and start a fresh error log."""
+        self.results_dir.mkdir(parents=True, exist_ok=True)
         try:
-            with open(self.errors_file, "a", encoding="utf-8") as ef:
-                ef.write(f"{datetime.utcnow().isoformat()}Z idx={req_idx} {message}\n")
+            with open(self.errors_file, "w", encoding="utf-8") as ef:
+                ef.write(f"=== Benchmark Error Log Started at {_utc_iso(time.time_ns())} ===\n")
         except Exception:
             pass
     
-    def save_results(self, results: List[Dict[str, float]]) -> None:
+    def _log_error(self, req_idx: int, label: str, exc: BaseException) -> None:
+        """Queue an error for the writer task (never touches the file or formats text)."""
+        if self._error_q is not None:
+            self._error_q.put_nowait((time.time_ns(), req_idx, label, exc))
+    
+    async def _error_writer(self, queue: asyncio.Queue[ErrorEntry | None]) -> None:
+        """Write queued error lines through one long-lived handle until a None sentinel.
+
+        Whatever is queued when the writer wakes up is formatted and written in
+        one go, in a worker thread so the event loop never blocks on file I/O.
+        """
+        try:
+            ef = open(self.errors_file, "a", encoding="utf-8")
+        except Exception:
+            ef = None
+        try:
+            done = False
+            while not done:
+                batch = [await queue.get()]
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+                if None in batch:
+                    done = True
+                    batch = [line for line in batch if line is not None]
+                if ef is not None and batch:
+                    try:
+                        await asyncio.to_thread(_write_error_batch, ef, batch)
+                    except Exception:
+                        pass
+        finally:
+            if ef is not None:
+                ef.close()
+    
+    def save_results(self, table: np.ndarray) -> None:
         """Save benchmark results to file."""
         try:
             self.results_dir.mkdir(parents=True, exist_ok=True)
             metrics_path = self.results_dir / "bench_metrics.jsonl"
-            with open(metrics_path, "w", encoding="utf-8") as f:
-                for rec in results:
-                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            # Serialize everything up front and hand the file a single buffer
+            if orjson is not None:
+                payload = b"".join(orjson.dumps(rec, option=orjson.OPT_APPEND_NEWLINE) for rec in metrics_records(table))
+            else:
+                payload = "".join(json.dumps(rec, ensure_ascii=False) + "\n" for rec in metrics_records(table)).encode("utf-8")
+            with open(metrics_path, "wb") as f:
+                f.write(payload)
             print(f"Saved per-stream metrics to {metrics_path}")
         except Exception as e:
             print(f"Warning: could not write metrics JSONL: {e}")
+
+
+def _utc_iso(ns: int) -> str:
+    """UTC ISO-8601 timestamp with a Z suffix for a time.time_ns() value."""
+    return datetime.fromtimestamp(ns / 1e9, tz=timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _write_error_batch(f, batch: List[ErrorEntry]) -> None:
+    """Blocking format + write for the error writer thread (one line per entry)."""
+    f.write("".join(
+        f"{_utc_iso(ns)} idx={req_idx} {label}{' '.join(str(exc)[:300].splitlines())}\n"
+        for ns, req_idx, label, exc in batch
+    ))
+    f.flush()
+
+
+def _run_shard(shard: tuple) -> Tuple[np.ndarray, int, int]:
+    """Worker-process entry point for BenchmarkRunner.run_processes."""
+    (server, secure, debug, shm_name, size, n, concurrency, rtf, batch_ms,
+     arrival_rate, progress_s, first_idx) = shard
+    shm = shared_memory.SharedMemory(name=shm_name)
+    pcm = shm.buf[:size]
+    try:
+        runner = BenchmarkRunner(server, secure, debug)
+        # The parent already started the shared error log; shards append to it
+        return run_async(
+            runner.run_benchmark(pcm, n, concurrency, rtf, batch_ms, arrival_rate, progress_s,
+                                 reset_error_log=False, first_idx=first_idx)
+        )
+    finally:
+        pcm.release()
+        shm.close()
@@ -5,7 +5,7 @@ import os
 import time
 from pathlib import Path
 
-from utils import is_runpod_host
+from utils import average_gap_ms, is_runpod_host
 from utils.messages import ClientMessageHandler
 from clients.base import YapClient
 
@@ -103,10 +103,7 @@ class InteractiveClient(YapClient):
         ]
         
         # Calculate avg gap
-        avg_gap_ms = 0.0
-        if len(handler.partial_ts) >= 2:
-            gaps = [b - a for a, b in zip(handler.partial_ts[:-1], handler.partial_ts[1:])]
-            avg_gap_ms = (sum(gaps) / len(gaps)) * 1000.0
+        avg_gap_ms = average_gap_ms(handler.partial_ts)
         more = [
             ("ttfw_ms", f"{ttfw_ms:.1f}"),
             ("partials", f"{len(handler.partial_ts)}"),
@@ -13,23 +13,25 @@ All commonly used items are re-exported here for convenience.
 # Re-export commonly used items for convenience
 from .files import (
     file_to_pcm16_mono_24k, file_to_pcm16_mono_16k, file_duration_seconds,
-    find_sample_files, find_sample_by_name, SAMPLES_DIR, EXTS
+    load_pcm16_mono_24k, find_sample_files, find_sample_by_name, SAMPLES_DIR, EXTS
 )
-from .network import ws_url, append_auth_query, is_runpod_host
+from .network import ws_url, append_auth_query, is_runpod_host, tune_ws_socket, uvloop_factory, run_async
 from .audio import (
-    pcm16_to_float32, iter_chunks, average_gap_ms, 
-    EOSDecider, AudioStreamer
+    pcm16_to_float32, iter_chunks, average_gap_ms, pack_audio_frames,
+    hop_for_batch, EOSDecider, AudioStreamer
 )
 from .messages import MessageHandler, BenchMessageHandler, ClientMessageHandler
 
 __all__ = [
     # Files
     'file_to_pcm16_mono_24k', 'file_to_pcm16_mono_16k', 'file_duration_seconds',
+    'load_pcm16_mono_24k',
     'find_sample_files', 'find_sample_by_name', 'SAMPLES_DIR', 'EXTS',
     # Network
-    'ws_url', 'append_auth_query', 'is_runpod_host',
+    'ws_url', 'append_auth_query', 'is_runpod_host', 'tune_ws_socket', 'uvloop_factory', 'run_async',
     # Audio
-    'pcm16_to_float32', 'iter_chunks', 'average_gap_ms', 'EOSDecider', 'AudioStreamer',
+    'pcm16_to_float32', 'iter_chunks', 'average_gap_ms', 'pack_audio_frames',
+    'hop_for_batch', 'EOSDecider', 'AudioStreamer',
     # Messages
     'MessageHandler', 'BenchMessageHandler', 'ClientMessageHandler',
 ]
\ No newline at end of file
@@ -3,10 +3,15 @@ from __future__ import annotations
 import asyncio
 import os
 import time
+from typing import Sequence
 
 import numpy as np
 import msgpack
 
+SAMPLE_RATE = 24000
+FRAME_MS = 80
+HOP = 1920  # 80 ms @ 24k
+
 
 def pcm16_to_float32(pcm_bytes: bytes) -> np.ndarray:
     """Convert PCM16 bytes to float32 in [-1, 1]."""
@@ -22,16 +27,86 @@ def iter_chunks(arr: np.ndarray, hop: int):
         yield chunk
 
 
-def average_gap_ms(partial_timestamps: list[float]) -> float:
+def hop_for_batch(batch_ms: int) -> int:
+    """Samples per Audio message when coalescing `batch_ms` of audio (whole 80 ms frames).
+
+    The server accepts any number of samples per Audio message, so batching
+    trades send granularity for fewer WebSocket writes.
+    """
+    return HOP * max(1, round(batch_ms / FRAME_MS))
+
+
+# msgpack {"type": "Audio", "pcm": <array>} up to the array header
+_AUDIO_PREFIX = msgpack.packb({"type": "Audio"}, use_bin_type=True)[1:] + msgpack.packb("pcm")
+_AUDIO_FLOATS = np.dtype([("tag", "u1"), ("value", ">f4")])  # msgpack float32: 0xca + big-endian
+
+
+def _msgpack_array_header(n: int) -> bytes:
+    """msgpack array header for n elements."""
+    if n < 16:
+        return bytes([0x90 | n])
+    if n < 1 << 16:
+        return b"\xdc" + n.to_bytes(2, "big")
+    return b"\xdd" + n.to_bytes(4, "big")
+
+
+def pack_audio_frame(pcm_chunk: np.ndarray) -> bytes:
+    """Pack one float32 chunk as a msgpack Audio message.
+
+    The server decodes `pcm` as a float32 array, so the samples cannot go out
+    as a single bin blob. Instead the array is written straight from numpy in
+    msgpack wire format, byte-identical to packb(..., use_single_float=True)
+    without building a Python float per sample.
+    """
+    body = np.empty(len(pcm_chunk), dtype=_AUDIO_FLOATS)
+    body["tag"] = 0xca
+    body["value"] = pcm_chunk
+    return b"\x82" + _AUDIO_PREFIX + _msgpack_array_header(len(pcm_chunk)) + body.tobytes()
+
+
+def pack_audio_frames(pcm_bytes: bytes, hop: int = HOP) -> tuple[memoryview | bytes, ...]:
+    """Pack PCM16 bytes into ready-to-send Audio messages, one per hop.
+
+    Sessions that stream the same audio can share the result instead of
+    re-decoding and re-packing it every time. Whole hops are laid out as the
+    rows of one (n_frames, message) byte matrix, so the header broadcast and the
+    float conversion are single numpy passes and each frame is a zero-copy
+    row view; only a short final hop is packed on its own.
+    """
+    samples = np.frombuffer(pcm_bytes, dtype=np.int16)
+    n_full = len(samples) // hop
+    header = np.frombuffer(b"\x82" + _AUDIO_PREFIX + _msgpack_array_header(hop), dtype=np.uint8)
+    rows = np.empty((n_full, len(header) + hop * _AUDIO_FLOATS.itemsize), dtype=np.uint8)
+    rows[:, :len(header)] = header
+    body = rows[:, len(header):].view(_AUDIO_FLOATS)
+    body["tag"] = 0xca
+    np.divide(samples[:n_full * hop].reshape(n_full, hop), 32768.0, out=body["value"], casting="unsafe")
+    
+    buf = memoryview(rows.reshape(-1))
+    width = rows.shape[1]
+    frames = [buf[i * width:(i + 1) * width] for i in range(n_full)]
+    if n_full * hop < len(samples):
+        frames.append(pack_audio_frame(samples[n_full * hop:] / np.float32(32768.0)))
+    return tuple(frames)
+
+
+SILENCE_FRAME = pack_audio_frame(np.zeros(HOP, dtype=np.float32))
+FLUSH_FRAME = msgpack.packb({"type": "Flush"}, use_bin_type=True)
+
+
+def average_gap_ms(partial_timestamps: Sequence[float]) -> float:
     """Compute average gap between consecutive partial timestamps in ms."""
     if len(partial_timestamps) < 2:
         return 0.0
-    gaps = [b - a for a, b in zip(partial_timestamps[:-1], partial_timestamps[1:])]
-    return (sum(gaps) / len(gaps)) * 1000.0
+    ts = np.asarray(partial_timestamps, dtype=np.float64)
+    return float(np.diff(ts).mean() * 1000.0)
 
 
 class EOSDecider:
     """Dynamic EOS 'settle gate' that waits for evidence utterance is over."""
+
+    __slots__ = ("target_eos_ms", "quiet_ms", "vad_hangover_ms",
+                 "vad_off_since", "last_partial_ts", "pending_word", "has_end_word")
     
     def __init__(self):
         # Configuration from environment variables
@@ -123,14 +198,18 @@ class EOSDecider:
 
 
 class AudioStreamer:
-    """Handles audio streaming with RTF control."""
+    """Streams prebuilt Audio messages (see pack_audio_frames) with RTF control."""
+
+    __slots__ = ("frames", "n_samples", "rtf", "debug", "hop", "sr", "last_chunk_sent_ts")
     
-    def __init__(self, pcm_bytes: bytes, rtf: float, debug: bool = False):
-        self.pcm_int16 = pcm16_to_float32(pcm_bytes)
+    def __init__(self, frames: Sequence[bytes], n_samples: int, rtf: float,
+                 debug: bool = False, hop: int = HOP):
+        self.frames = frames
+        self.n_samples = n_samples
         self.rtf = rtf
         self.debug = debug
-        self.hop = 1920  # 80 ms @ 24k
-        self.sr = 24000
+        self.hop = hop
+        self.sr = SAMPLE_RATE
         self.last_chunk_sent_ts = 0.0
         
     async def stream_audio(self, ws, eos_decider: EOSDecider, on_first_audio_sent=None):
@@ -143,12 +222,15 @@ class AudioStreamer:
             print("DEBUG: Starting audio stream")
         
         t_stream0 = time.perf_counter()
+        # Deadline scheduler: each frame is due one step after the previous one,
+        # so lateness never accumulates and we skip sleeping while behind.
+        sec_per_sample = 1.0 / (self.sr * max(self.rtf, 1e-6))
+        step_s = self.hop * sec_per_sample
+        stream_end = t_stream0 + self.n_samples * sec_per_sample
+        next_send = t_stream0
         first_chunk_sent_ts = 0.0
-        samples_sent = 0
         
-        for pcm_chunk in iter_chunks(self.pcm_int16, self.hop):
-            msg = msgpack.packb({"type": "Audio", "pcm": pcm_chunk.tolist()},
-                               use_bin_type=True, use_single_float=True)
+        for msg in self.frames:
             # Record the first time we place audio on the wire
             if first_chunk_sent_ts == 0.0:
                 first_chunk_sent_ts = time.perf_counter()
@@ -158,13 +240,14 @@ class AudioStreamer:
                     except Exception:
                         pass
             await ws.send(msg)
-            self.last_chunk_sent_ts = time.perf_counter()
+            # One clock read per frame: it stamps the send and drives pacing
+            now = time.perf_counter()
+            self.last_chunk_sent_ts = now
             
-            samples_sent += len(pcm_chunk)
-            target = t_stream0 + (samples_sent / self.sr) / max(self.rtf, 1e-6)
-            sleep_for = target - time.perf_counter()
-            if sleep_for > 0:
-                await asyncio.sleep(sleep_for)
+            next_send = min(next_send + step_s, stream_end)
+            delay = next_send - now
+            if delay > 0:
+                await asyncio.sleep(delay)
         
         # Dynamic EOS settle gate
         if self.debug:
@@ -184,13 +267,11 @@ class AudioStreamer:
         if frames > 0:
             if self.debug:
                 print(f"DEBUG: Adding {frames} silence frames ({frames * 80:.0f}ms)")
-            silence = np.zeros(1920, dtype=np.float32).tolist()
             for _ in range(frames):
-                await ws.send(msgpack.packb({"type": "Audio", "pcm": silence},
-                                            use_bin_type=True, use_single_float=True))
+                await ws.send(SILENCE_FRAME)
         
         # Final flush
-        await ws.send(msgpack.packb({"type": "Flush"}, use_bin_type=True))
+        await ws.send(FLUSH_FRAME)
         if self.debug:
             print("DEBUG: Sent final Flush")
         
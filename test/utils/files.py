@@ -1,5 +1,6 @@
 """File and audio processing utilities."""
 from __future__ import annotations
+import functools
 import os
 import subprocess
 from pathlib import Path
@@ -19,8 +20,8 @@ def find_sample_files() -> list[str]:
     files = []
     for root, _, filenames in os.walk(SAMPLES_DIR):
         for f in filenames:
-            if Path(f).suffix.lower() in EXTS:
-                files.append(str(Path(root) / f))
+            if os.path.splitext(f)[1].lower() in EXTS:
+                files.append(os.path.join(root, f))
     return files
 
 
@@ -103,3 +104,20 @@ def file_duration_seconds(path: str) -> float:
         # fallback: decode to find length (can be expensive, but ok for tests)
         pcm, sr = _ffmpeg_decode_to_pcm16_mono_16k(path)
         return float(len(pcm) / sr)
+
+
+@functools.lru_cache(maxsize=16)
+def _load_pcm16_mono_24k(path: str, size: int, mtime_ns: int) -> Tuple[bytes, float]:
+    """Decode once per file version (size/mtime are part of the cache key)."""
+    pcm = file_to_pcm16_mono_24k(path)
+    return pcm, len(pcm) // 2 / 24000.0
+
+
+def load_pcm16_mono_24k(path: str) -> Tuple[bytes, float]:
+    """Return (PCM16 mono @24k bytes, duration seconds) for an audio file.
+
+    Memoized in-process by (path, size, mtime) so repeated loads skip the decode;
+    the duration is that of the decoded PCM, so no second probe is needed.
+    """
+    st = os.stat(path)
+    return _load_pcm16_mono_24k(os.path.abspath(path), st.st_size, st.st_mtime_ns)
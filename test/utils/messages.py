@@ -2,20 +2,34 @@
 from __future__ import annotations
 import asyncio
 import time
+from array import array
 
 import msgpack
 import websockets
 
 from .audio import EOSDecider
 
+# Server messages are msgpack maps with "type" first. Step messages arrive every
+# model step carrying per-step probabilities we never read, so they are
+# recognised from this header and skipped without decoding the payload.
+_STEP_HEADER = msgpack.packb("type") + msgpack.packb("Step")
+
 
 class MessageHandler:
     """Base WebSocket message handler for Yap ASR protocol."""
+
+    # One handler per session; slots keep per-instance state compact at high concurrency
+    __slots__ = (
+        "debug", "track_word_ttfw", "partial_ts", "last_partial_ts", "final_recv_ts",
+        "final_text", "last_text", "words", "ttfw", "ttfw_word", "ttfw_text",
+        "ready_event", "done_event", "reject_reason", "eos_decider",
+    )
     
     def __init__(self, debug: bool = False, track_word_ttfw: bool = False):
         self.debug = debug
         self.track_word_ttfw = track_word_ttfw
-        self.partial_ts: list[float] = []
+        # Unboxed doubles; appended once per partial for the whole session
+        self.partial_ts = array("d")
         self.last_partial_ts = 0.0
         self.final_recv_ts = 0.0
         self.final_text = ""
@@ -123,11 +137,20 @@ class MessageHandler:
                 if self.debug:
                     print(f"DEBUG: Treating close as final, text: '{self.final_text}'")
     
+    def handle_timeout(self):
+        """Stop waiting for Final: keep what arrived (as on close) and release waiters."""
+        self.handle_connection_close()
+        self.done_event.set()
+    
     async def process_messages(self, ws, t0: float):
         """Main message processing loop."""
         try:
             async for raw in ws:
                 if isinstance(raw, (bytes, bytearray)):
+                    if not self.debug and raw.startswith(_STEP_HEADER, 1):
+                        continue
+                    # Stamp on receipt, before decoding, so TTFW excludes client-side parse time
+                    now = time.perf_counter()
                     if self.debug:
                         print(f"DEBUG: Received binary message (length: {len(raw)})")
                     data = msgpack.unpackb(raw, raw=False)
@@ -136,8 +159,6 @@ class MessageHandler:
                     if self.debug:
                         print(f"DEBUG: Received {kind}: {data}")
                     
-                    now = time.perf_counter()
-                    
                     if kind == "Ready":
                         self.handle_ready(now)
                     elif kind in ("Partial", "Text"):
@@ -178,13 +199,16 @@ class MessageHandler:
             if self.debug:
                 print(f"DEBUG: Connection closed with error: {e}")
             self.handle_connection_close()
-        
-        if self.final_recv_ts == 0.0:
-            self.final_recv_ts = time.perf_counter()
+        finally:
+            # Also runs when the session cancels this task (e.g. after a timeout)
+            if self.final_recv_ts == 0.0:
+                self.final_recv_ts = time.perf_counter()
 
 
 class BenchMessageHandler(MessageHandler):
     """Bench-specific message handler that raises CapacityRejected."""
+
+    __slots__ = ()
     
     def __init__(self, debug: bool = False):
         super().__init__(debug=debug, track_word_ttfw=True)
@@ -199,6 +223,8 @@ class BenchMessageHandler(MessageHandler):
 
 class ClientMessageHandler(MessageHandler):
     """Client-specific message handler with printing and first response tracking."""
+
+    __slots__ = ("first_response_time", "first_audio_sent", "quiet")
     
     def __init__(self, debug: bool = False, quiet: bool = False):
         super().__init__(debug=debug, track_word_ttfw=False)
@@ -1,31 +1,13 @@
 """Metrics calculation and reporting utilities."""
 from __future__ import annotations
-import statistics as stats
-from typing import Dict, List
+from dataclasses import dataclass
+from math import isfinite
+from operator import attrgetter
+from typing import Any, Dict, Iterator, NamedTuple
 
+import numpy as np
 
-def calculate_basic_metrics(audio_duration_s: float, wall_s: float, 
-                          ttfw_word_s: float | None = None, 
-                          ttfw_text_s: float | None = None) -> Dict[str, float]:
-    """Calculate basic performance metrics."""
-    rtf = wall_s / audio_duration_s if audio_duration_s > 0 else float("inf")
-    xrt = (audio_duration_s / wall_s) if wall_s > 0 else 0.0
-    throughput_min_per_min = (audio_duration_s / wall_s) if wall_s > 0 else 0.0
-    
-    metrics = {
-        "wall_s": wall_s,
-        "audio_s": audio_duration_s,
-        "rtf": rtf,
-        "xrt": xrt,
-        "throughput_min_per_min": throughput_min_per_min,
-    }
-    
-    if ttfw_word_s is not None:
-        metrics["ttfw_word_s"] = float(ttfw_word_s)
-    if ttfw_text_s is not None:
-        metrics["ttfw_text_s"] = float(ttfw_text_s)
-    
-    return metrics
+from .audio import average_gap_ms
 
 
 def calculate_detailed_metrics(handler, streamer, t0: float, last_signal_ts: float, 
@@ -43,11 +25,7 @@ def calculate_detailed_metrics(handler, streamer, t0: float, last_signal_ts: flo
     }
     
     # Timing metrics
-    if len(handler.partial_ts) >= 2:
-        gaps = [b - a for a, b in zip(handler.partial_ts[:-1], handler.partial_ts[1:])]
-        metrics["avg_partial_gap_ms"] = float((sum(gaps) / len(gaps)) * 1000.0)
-    else:
-        metrics["avg_partial_gap_ms"] = 0.0
+    metrics["avg_partial_gap_ms"] = average_gap_ms(handler.partial_ts)
     
     # Latency metrics
     metrics["finalize_ms"] = float(
@@ -76,56 +54,156 @@ def calculate_detailed_metrics(handler, streamer, t0: float, last_signal_ts: flo
     return metrics
 
 
-def percentile(values: List[float], q: float) -> float:
-    """Calculate percentile of values."""
-    if not values:
-        return 0.0
-    k = max(0, min(len(values)-1, int(round(q*(len(values)-1)))))
-    return sorted(values)[k]
+@dataclass(slots=True)
+class SessionMetrics:
+    """Metrics of one benchmark session, built once without intermediate dicts.
+
+    Rates derived from wall_s/audio_s (rtf, xrt, throughput) are not stored;
+    with_rates() computes them as vectorized table columns.
+    """
+    wall_s: float
+    audio_s: float
+    wall_to_final_s: float
+    rtf_measured: float | None
+    partials: float
+    final_len_chars: float
+    rtf_target: float
+    avg_partial_gap_ms: float
+    finalize_ms: float
+    send_duration_s: float
+    post_send_final_s: float
+    delta_to_audio_ms: float
+    flush_to_final_ms: float
+    decode_tail_ms: float
+    ttfw_word_s: float | None = None
+    ttfw_text_s: float | None = None
+
+    @classmethod
+    def from_session(cls, handler, t0: float, last_signal_ts: float, last_chunk_sent_ts: float,
+                     file_duration_s: float, rtf: float, wall_s: float) -> "SessionMetrics":
+        """Build the record straight from handler state and session timestamps."""
+        final_ts = handler.final_recv_ts
+        wall_to_final = (final_ts - t0) if final_ts else (last_signal_ts - t0)
+        flush_ms = ((final_ts - last_signal_ts) * 1000.0) if (final_ts and last_signal_ts) else 0.0
+        n_partials = len(handler.partial_ts)
+        return cls(
+            wall_s=wall_s,
+            audio_s=file_duration_s,
+            wall_to_final_s=float(wall_to_final),
+            rtf_measured=float(wall_to_final / file_duration_s) if file_duration_s > 0 else None,
+            partials=float(n_partials),
+            final_len_chars=float(len(handler.final_text)),
+            rtf_target=float(rtf),
+            avg_partial_gap_ms=average_gap_ms(handler.partial_ts),
+            finalize_ms=float(flush_ms),
+            send_duration_s=float((last_chunk_sent_ts - t0) if last_chunk_sent_ts else 0.0),
+            post_send_final_s=float(
+                (final_ts - last_chunk_sent_ts) if (final_ts and last_chunk_sent_ts) else 0.0
+            ),
+            delta_to_audio_ms=float((wall_to_final - file_duration_s) * 1000.0),
+            flush_to_final_ms=float(flush_ms),
+            decode_tail_ms=float(
+                ((final_ts - handler.last_partial_ts) * 1000.0)
+                if (final_ts and handler.last_partial_ts) else 0.0
+            ),
+            ttfw_word_s=float(handler.ttfw_word) if handler.ttfw_word is not None else None,
+            ttfw_text_s=float(handler.ttfw_text) if handler.ttfw_text is not None else None,
+        )
+
+    def as_row(self) -> tuple:
+        """Stored fields in STORED_DTYPE order, for writing into a metrics buffer."""
+        return _metrics_row(self)
+
+
+_STORED_FIELDS = SessionMetrics.__slots__
+_DERIVED_FIELDS = ("rtf", "xrt", "throughput_min_per_min")
+# Per-session buffer layout (one float64 per stored field; unset values are NaN)
+STORED_DTYPE = np.dtype([(name, np.float64) for name in _STORED_FIELDS])
+# Full table layout: stored fields plus the derived rates
+METRICS_DTYPE = np.dtype(STORED_DTYPE.descr + [(name, np.float64) for name in _DERIVED_FIELDS])
+# JSONL key order: wall/audio first, then the rates, then everything else
+_RECORD_FIELDS = _STORED_FIELDS[:2] + _DERIVED_FIELDS + _STORED_FIELDS[2:]
+_OPTIONAL_FIELDS = ("ttfw_word_s", "ttfw_text_s")
+_metrics_row = attrgetter(*_STORED_FIELDS)
+
 
+def with_rates(stored: np.ndarray) -> np.ndarray:
+    """Full metrics table from a STORED_DTYPE array; derived rates computed for all rows at once."""
+    table = np.empty(len(stored), dtype=METRICS_DTYPE)
+    for name in _STORED_FIELDS:
+        table[name] = stored[name]
+    wall, audio = stored["wall_s"], stored["audio_s"]
+    table["rtf"] = np.divide(wall, audio, out=np.full_like(wall, np.inf), where=audio > 0)
+    table["xrt"] = np.divide(audio, wall, out=np.zeros_like(wall), where=wall > 0)
+    table["throughput_min_per_min"] = table["xrt"]
+    return table
 
-def summarize_results(title: str, results: List[Dict[str, float]]) -> None:
-    """Print summary statistics for benchmark results."""
-    if not results:
+
+def metrics_records(table: np.ndarray) -> Iterator[Dict[str, Any]]:
+    """Plain dicts for JSONL output; unset TTFW fields are omitted, other unset values are None.
+
+    Non-finite values (NaN for unset, inf rtf when audio_s is 0) become None, so
+    the orjson and stdlib json writers produce the same records.
+    """
+    for values in table[list(_RECORD_FIELDS)].tolist():
+        rec = {name: (v if isfinite(v) else None) for name, v in zip(_RECORD_FIELDS, values)}
+        for name in _OPTIONAL_FIELDS:
+            if rec[name] is None:
+                del rec[name]
+        yield rec
+
+
+class SummaryRow(NamedTuple):
+    """One line of the benchmark summary."""
+    label: str
+    key: str
+    decimals: int
+    positive_only: bool = False
+    percentiles: bool = True
+    unit: str = ""
+
+
+SUMMARY_ROWS = (
+    SummaryRow("Wall s      ", "wall_s", 4),
+    SummaryRow("TTFW(word)  ", "ttfw_word_s", 4),
+    SummaryRow("TTFW(text)  ", "ttfw_text_s", 4),
+    SummaryRow("Audio s     ", "audio_s", 4, percentiles=False),
+    SummaryRow("RTF         ", "rtf", 4),
+    SummaryRow("RTF(meas)   ", "rtf_measured", 4),
+    SummaryRow("xRT         ", "xrt", 4, percentiles=False),
+    SummaryRow("Throughput  ", "throughput_min_per_min", 2, percentiles=False, unit=" min/min"),
+    SummaryRow("Δ(audio) ms ", "delta_to_audio_ms", 1),
+    SummaryRow("Send dur s  ", "send_duration_s", 3),
+    SummaryRow("Post-send→Final s ", "post_send_final_s", 3),
+    SummaryRow("Flush→Final ms    ", "flush_to_final_ms", 1, positive_only=True),
+    SummaryRow("Decode tail ms    ", "decode_tail_ms", 1, positive_only=True),
+    SummaryRow("Partial gap ms    ", "avg_partial_gap_ms", 1, positive_only=True),
+)
+
+
+def _column_stats(row: SummaryRow, col: np.ndarray) -> tuple[int, float, float, float, float]:
+    """Return (count, mean, std, p50, p95) for one summary column."""
+    arr = col[col > 0] if row.positive_only else col[~np.isnan(col)]
+    if arr.size == 0:
+        return 0, 0.0, 0.0, 0.0, 0.0
+    p50, p95 = np.percentile(arr, [50, 95])
+    return int(arr.size), float(arr.mean()), float(arr.std()), float(p50), float(p95)
+
+
+def summarize_results(title: str, table: np.ndarray) -> None:
+    """Print summary statistics for a metrics table (see with_rates)."""
+    if len(table) == 0:
         print(f"{title}: no results")
         return
 
-    wall = [r["wall_s"] for r in results]
-    audio = [r["audio_s"] for r in results]
-    rtf = [r["rtf"] for r in results]
-    rtf_measured = [r["rtf_measured"] for r in results if "rtf_measured" in r and r["rtf_measured"] is not None]
-    xrt = [r["xrt"] for r in results]
-    throughput = [r["throughput_min_per_min"] for r in results]
-    ttfw_word_vals = [r["ttfw_word_s"] for r in results if "ttfw_word_s" in r]
-    ttfw_text_vals = [r["ttfw_text_s"] for r in results if "ttfw_text_s" in r]
-    fin = [r.get("finalize_ms", 0.0) for r in results if r.get("finalize_ms", 0.0) > 0]
-    gaps = [r.get("avg_partial_gap_ms", 0.0) for r in results if r.get("avg_partial_gap_ms", 0.0) > 0]
-
-    # New honest metrics
-    deltas = [r["delta_to_audio_ms"] for r in results if "delta_to_audio_ms" in r]
-    sendd = [r["send_duration_s"] for r in results if "send_duration_s" in r]
-    postf = [r["post_send_final_s"] for r in results if "post_send_final_s" in r]
-    f2f = [r["flush_to_final_ms"] for r in results if "flush_to_final_ms" in r and r["flush_to_final_ms"] > 0]
-    dtail = [r["decode_tail_ms"] for r in results if "decode_tail_ms" in r and r["decode_tail_ms"] > 0]
-
     print(f"\n== {title} ==")
-    print(f"n={len(results)}")
-    print(f"Wall s      | avg={stats.mean(wall):.4f}  p50={stats.median(wall):.4f}  p95={percentile(wall,0.95):.4f}")
-    if ttfw_word_vals:
-        print(f"TTFW(word)  | avg={stats.mean(ttfw_word_vals):.4f}  p50={stats.median(ttfw_word_vals):.4f}  p95={percentile(ttfw_word_vals,0.95):.4f}")
-    if ttfw_text_vals:
-        print(f"TTFW(text)  | avg={stats.mean(ttfw_text_vals):.4f}  p50={stats.median(ttfw_text_vals):.4f}  p95={percentile(ttfw_text_vals,0.95):.4f}")
-    print(f"Audio s     | avg={stats.mean(audio):.4f}")
-    print(f"RTF         | avg={stats.mean(rtf):.4f}  p50={stats.median(rtf):.4f}  p95={percentile(rtf,0.95):.4f}")
-    if rtf_measured:
-        print(f"RTF(meas)   | avg={stats.mean(rtf_measured):.4f}  p50={stats.median(rtf_measured):.4f}  p95={percentile(rtf_measured,0.95):.4f}")
-    print(f"xRT         | avg={stats.mean(xrt):.4f}")
-    print(f"Throughput  | avg={stats.mean(throughput):.2f} min/min")
-    
-    # New honest metrics display
-    if deltas: print(f"Δ(audio) ms | avg={stats.mean(deltas):.1f}  p50={percentile(deltas,0.50):.1f}  p95={percentile(deltas,0.95):.1f}")
-    if sendd:  print(f"Send dur s  | avg={stats.mean(sendd):.3f}  p50={stats.median(sendd):.3f}  p95={percentile(sendd,0.95):.3f}")
-    if postf:  print(f"Post-send→Final s | avg={stats.mean(postf):.3f}  p50={stats.median(postf):.3f}  p95={percentile(postf,0.95):.3f}")
-    if f2f:    print(f"Flush→Final ms    | avg={stats.mean(f2f):.1f}  p50={percentile(f2f,0.50):.1f}  p95={percentile(f2f,0.95):.1f}")
-    if dtail:  print(f"Decode tail ms    | avg={stats.mean(dtail):.1f}  p50={percentile(dtail,0.50):.1f}  p95={percentile(dtail,0.95):.1f}")
-    if gaps:   print(f"Partial gap ms    | avg={stats.mean(gaps):.1f}  p50={percentile(gaps,0.50):.1f}  p95={percentile(gaps,0.95):.1f}")
+    print(f"n={len(table)}")
+    for row in SUMMARY_ROWS:
+        n, mean, std, p50, p95 = _column_stats(row, table[row.key])
+        if n == 0:
+            continue
+        d = row.decimals
+        if row.percentiles:
+            print(f"{row.label}| avg={mean:.{d}f}  std={std:.{d}f}  p50={p50:.{d}f}  p95={p95:.{d}f}")
+        else:
+            print(f"{row.label}| avg={mean:.{d}f}{row.unit}")
@@ -1,7 +1,15 @@
 """Network and WebSocket utilities."""
 from __future__ import annotations
+import asyncio
+import socket
+import sys
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
+try:
+    import uvloop  # type: ignore
+except Exception:
+    uvloop = None
+
 
 def ws_url(server: str, secure: bool) -> str:
     """Generate WebSocket URL for Yap server ASR streaming endpoint.
@@ -57,3 +65,38 @@ def is_runpod_host(server: str) -> bool:
     """Check if server is a RunPod host."""
     s = (server or "").strip().lower()
     return "runpod.net" in s
+
+
+def tune_ws_socket(ws) -> None:
+    """Disable Nagle on a connected WebSocket's socket.
+
+    Small Audio frames must not be coalesced (that would skew TTFW). Buffer
+    sizes are left to kernel autotuning. Best-effort: a refused option is ignored.
+    """
+    sock = ws.transport.get_extra_info("socket") if ws.transport is not None else None
+    if sock is None:
+        return
+    try:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    except OSError:
+        pass
+
+
+def uvloop_factory():
+    """Event loop factory for uvloop, or None when it is not installed."""
+    return uvloop.new_event_loop if uvloop is not None else None
+
+
+def run_async(main):
+    """asyncio.run(main) on uvloop when it is installed.
+
+    Python 3.12+ passes the loop factory to asyncio.run (uvloop.install() is
+    deprecated there); older Pythons fall back to installing the uvloop policy.
+    """
+    factory = uvloop_factory()
+    if factory is None:
+        return asyncio.run(main)
+    if sys.version_info >= (3, 12):
+        return asyncio.run(main, loop_factory=factory)
+    uvloop.install()
+    return asyncio.run(main)
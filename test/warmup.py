@@ -6,11 +6,10 @@ Quick health check for the Yap STT server.
 """
 from __future__ import annotations
 import argparse
-import asyncio
 import os
 from pathlib import Path
 
-from utils import file_to_pcm16_mono_24k, file_duration_seconds, SAMPLES_DIR
+from utils import load_pcm16_mono_24k, SAMPLES_DIR, run_async
 from clients.warmup import WarmupClient
 
 
@@ -45,12 +44,11 @@ def main() -> int:
         return 1
 
     # Load audio
-    pcm_bytes = file_to_pcm16_mono_24k(str(audio_path))
-    duration = file_duration_seconds(str(audio_path))
+    pcm_bytes, duration = load_pcm16_mono_24k(str(audio_path))
 
     # Run warmup
     client = WarmupClient(args.server, args.secure, debug=args.debug)
-    res = asyncio.run(client.run_warmup(pcm_bytes, args.rtf, args.debug))
+    res = run_async(client.run_warmup(pcm_bytes, args.rtf, args.debug))
 
     # Print results
     if res.get("error"):